@@ -0,0 +1,21 @@
+"""Numba-compiled risk scoring used by AutonomousDecisionSystem when numba is installed."""
+from numba import njit
+
+
+@njit(cache=True, fastmath=True)
+def compute_risk(xyxyn, cls, vulnerable):
+    """
+    xyxyn: float32[:, 4] normalized boxes, cls: int32[:] class ids, vulnerable: int32[:] class ids.
+    Returns (tallest normalized box height, number of boxes with a vulnerable class).
+    """
+    max_h_norm = 0.0
+    vulnerable_count = 0
+    for i in range(xyxyn.shape[0]):
+        h_norm = xyxyn[i, 3] - xyxyn[i, 1]
+        if h_norm > max_h_norm:
+            max_h_norm = h_norm
+        for v in vulnerable:
+            if cls[i] == v:
+                vulnerable_count += 1
+                break
+    return max_h_norm, vulnerable_count
@@ -1,22 +1,184 @@
+import os
+import sys
+import queue
+import shutil
+import subprocess
+import threading
 import cv2
 import numpy as np
+import torch
 from ultralytics import YOLO
-from collections import deque
+from ultralytics.utils.plotting import Annotator, colors
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 import time
 
+try:
+    from turbojpeg import TurboJPEG, TJSAMP_420
+except ImportError:
+    TurboJPEG = None
+
+try:
+    from _risk_numba import compute_risk
+    _NUMBA_AVAILABLE = True
+except (ImportError, RuntimeError):  # RuntimeError: numba has no writable cache location
+    _NUMBA_AVAILABLE = False
+
+class FFmpegWriter:
+    """cv2.VideoWriter stand-in that pipes raw BGR frames into an ffmpeg H.264 encoder."""
+
+    def __init__(self, output_path, fps, size, encoder):
+        preset = "p1" if encoder == "h264_nvenc" else "veryfast"
+        self._ff = subprocess.Popen(
+            ["ffmpeg", "-y", "-loglevel", "error",
+             "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{size[0]}x{size[1]}", "-r", str(fps or 30), "-i", "-",
+             # yuv420p needs even dimensions; pad odd-sized videos by one pixel
+             "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+             "-c:v", encoder, "-preset", preset, "-pix_fmt", "yuv420p", "-movflags", "+faststart", output_path],
+            stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        self._ff.stdin.write(np.ascontiguousarray(frame).data)
+
+    def release(self):
+        if self._ff.stdin.closed: return
+        try:
+            self._ff.stdin.close()
+        except BrokenPipeError:
+            pass  # ffmpeg already died; its exit code below reports it
+        if self._ff.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with code {self._ff.returncode}")
+
 class AutonomousDecisionSystem:
     def __init__(self, model_path):
-        self.model = YOLO(model_path)
+        self.IMGSZ = 640
+        self.BATCH_SIZE = 8
+        self.PIPELINE_DEPTH = 2  # Batches decoded ahead of the model in process_video
+        self.has_cuda = torch.cuda.is_available()  # TensorRT engines / INT8 calibration need CUDA
+        # Native FP16 on CUDA (also covers the .pt fallback when TensorRT isn't usable)
+        self._infer_kwargs = dict(half=True, device=0) if self.has_cuda else {}
+        self.model = self.load_model(model_path)
         self.CRITICAL_CLASSES = [0, 1, 2, 3, 5, 7]
         self.VULNERABLE_CLASSES = [0, 1] 
+        self.VULNERABLE_CLASSES_ARR = np.array(self.VULNERABLE_CLASSES, dtype=np.int32)
         self.MIN_CONFIDENCE = 0.5
         self.RISK_THRESHOLD_STOP = 3.5
         self.RISK_THRESHOLD_SLOW = 1.2
+        # Mean abs grayscale diff below which process_video reuses the previous detections (0 = off)
+        self.STATIC_DIFF_THRESHOLD = 2.0
         self.decision_buffer = deque(maxlen=10)
+        self._vote_counts = Counter()  # Histogram of decision_buffer, updated as it rotates
+        
+        # HUD bars rendered once per action for the current frame width
+        self.HUD_HEIGHT = 80
+        self._hud_cache = {}
+        self._hud_width = None
+        
+        # Host-side box buffers reused across frames (per thread: feed and uploads can run concurrently)
+        self.BOX_BUF_ROWS = 256
+        self._box_bufs = threading.local()
         
         self.streaming_running = False
         self.latest_action = "--"
         self.webcam_capture = None
+        self._ffmpeg_codec = None  # Resolved on first process_video
+        self._cam_thread = None
+        self._frame_cond = threading.Condition()
+        self._latest_frame = None
+        self._frame_gen = 0  # Bumped by the camera thread for every new frame
+        self._stream_id = 0  # Identifies the /video_feed stream that currently owns the camera
+        
+        # libjpeg-turbo (SIMD) encoder for the MJPEG feed, cv2.imencode when unavailable
+        self.JPEG_QUALITY = 70
+        self.PHASH_MAX_DISTANCE = 4  # Differing hash bits below which a feed frame reuses the last JPEG
+        self._tj = None
+        if TurboJPEG is not None:
+            try:
+                self._tj = TurboJPEG()
+            except (OSError, RuntimeError) as e:
+                print(f"⚠️ libturbojpeg not found ({e}), using cv2.imencode")
+        
+        self.warmup()
+
+    def load_model(self, model_path):
+        """
+        Loads the fastest available backend for model_path.
+        CUDA host -> INT8 TensorRT engine if one was calibrated (see build_int8_engine),
+                     else FP16 TensorRT engine cached next to the weights (built once)
+        Otherwise -> plain PyTorch .pt weights
+        """
+        if not torch.cuda.is_available():
+            return YOLO(model_path)
+
+        int8_path = self.int8_engine_path(model_path)
+        if os.path.exists(int8_path):
+            try:
+                return self._load_engine(int8_path)
+            except Exception as e:
+                print(f"⚠️ INT8 engine unusable ({e}), trying FP16")
+
+        engine_path = os.path.splitext(model_path)[0] + ".engine"
+        try:
+            if not os.path.exists(engine_path):
+                # dynamic=True so single frames and batches up to BATCH_SIZE share one engine
+                engine_path = YOLO(model_path).export(format="engine", half=True, imgsz=self.IMGSZ,
+                                                      dynamic=True, batch=self.BATCH_SIZE)
+            return self._load_engine(engine_path)
+        except Exception as e:
+            print(f"⚠️ TensorRT engine unavailable ({e}), using {model_path}")
+            return YOLO(model_path)
+
+    @staticmethod
+    def int8_engine_path(model_path):
+        return os.path.splitext(model_path)[0] + "_int8.engine"
+
+    def _load_engine(self, engine_path):
+        # Engines are deserialized lazily on first predict; do it now so a bad engine fails here
+        model = YOLO(engine_path, task="detect")
+        model.predict(np.zeros((self.IMGSZ, self.IMGSZ, 3), dtype=np.uint8), imgsz=self.IMGSZ,
+                      verbose=False, **self._infer_kwargs)
+        return model
+
+    def build_int8_engine(self, model_path, calib_yaml):
+        """
+        Exports an INT8 TensorRT engine calibrated on the images of calib_yaml and switches to it.
+        On failure the current model (FP16 engine or .pt) stays in use. Returns True on success.
+        """
+        if not torch.cuda.is_available():
+            return False
+
+        int8_path = self.int8_engine_path(model_path)
+        # Export names the engine after its weights file, so export from a copy to keep the FP16 engine
+        int8_weights = os.path.splitext(int8_path)[0] + ".pt"
+        try:
+            shutil.copyfile(model_path, int8_weights)
+            engine_path = YOLO(int8_weights).export(format="engine", int8=True, data=calib_yaml, imgsz=self.IMGSZ,
+                                                    dynamic=True, batch=self.BATCH_SIZE)
+            self.model = self._load_engine(engine_path)
+            return True
+        except Exception as e:
+            print(f"⚠️ INT8 export failed ({e}), keeping current model")
+            if os.path.exists(int8_path): os.remove(int8_path)
+            return False
+        finally:
+            if os.path.exists(int8_weights): os.remove(int8_weights)
+
+    def warmup(self):
+        """One dummy inference so the first real request doesn't pay setup/autotune cost."""
+        self.infer([np.zeros((self.IMGSZ, self.IMGSZ, 3), dtype=np.uint8)])
+        self._to_channels_last()
+        # A blank frame has no boxes, so compile/load the numba kernel explicitly
+        self.score_boxes(np.zeros((1, 4), dtype=np.float32), np.zeros(1, dtype=np.int32))
+
+    def _to_channels_last(self):
+        """
+        NHWC conv weights let cuDNN pick its faster Tensor Core kernels (.pt weights on CUDA only).
+        Must run after the first predict: the predictor's AutoBackend fuses Conv+BN into freshly
+        allocated NCHW layers, so converting self.model.model beforehand would be undone.
+        """
+        backend = getattr(self.model.predictor, "model", None)
+        if torch.cuda.is_available() and getattr(backend, "pt", False):
+            backend.model.to(memory_format=torch.channels_last)
 
     def analyze_frame(self, frame, draw_hud=True):
         """
@@ -24,21 +186,110 @@ class AutonomousDecisionSystem:
         draw_hud=True  -> Burns 'ACTION: STOP' onto the image (For saved files/Popups)
         draw_hud=False -> Returns clean video (For Browser Feed)
         """
-        results = self.model(frame, conf=self.MIN_CONFIDENCE, classes=self.CRITICAL_CLASSES, verbose=False)
-        plotted_frame = results[0].plot()  # Default YOLO colors
-        
-        height, width, _ = frame.shape
+        return self.process_result(frame, self.infer([frame])[0], draw_hud)
+
+    def analyze_batch(self, frames, draw_hud=True):
+        """Same as analyze_frame, but runs a single model call over a list of frames."""
+        return [self.process_result(frame, result, draw_hud) for frame, result in zip(frames, self.infer(frames))]
+
+    def infer(self, frames):
+        """
+        Runs the model once over frames, each downscaled so its long side is IMGSZ.
+        Boxes in the returned results are mapped back to the original frame size.
+        """
+        inputs, scales = [], []
+        for frame in frames:
+            h, w = frame.shape[:2]
+            s = self.IMGSZ / max(h, w)
+            if s < 1.0:
+                frame = cv2.resize(frame, (int(w * s), int(h * s)), interpolation=cv2.INTER_LINEAR)
+            else:
+                s = 1.0
+            inputs.append(frame)
+            scales.append(s)
+
+        results = self.model(inputs, conf=self.MIN_CONFIDENCE, classes=self.CRITICAL_CLASSES,
+                             imgsz=self.IMGSZ, verbose=False, **self._infer_kwargs)
+
+        for frame, result, s in zip(frames, results, scales):
+            if s == 1.0: continue
+            data = result.boxes.data.clone()
+            data[:, :4] /= s
+            result.orig_img = frame
+            result.orig_shape = frame.shape[:2]
+            result.update(boxes=data)
+        return results
+
+    def analyze_video_batch(self, frames, scene):
+        """
+        analyze_batch for process_video that skips the model on near-static frames.
+        A frame whose 80x60 grayscale thumbnail differs from the last analyzed (key) frame by
+        less than STATIC_DIFF_THRESHOLD on average reuses its detections and action; only
+        the boxes and HUD are redrawn. scene carries the last key frame between batches.
+        """
+        is_key = []
+        for frame in frames:
+            small = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (80, 60), interpolation=cv2.INTER_AREA)
+            key = ("small" not in scene or
+                   np.mean(cv2.absdiff(scene["small"], small)) >= self.STATIC_DIFF_THRESHOLD)
+            if key: scene["small"] = small
+            is_key.append(key)
+
+        key_frames = [frame for frame, key in zip(frames, is_key) if key]
+        results = iter(self.infer(key_frames) if key_frames else [])
+        processed = []
+        for frame, key in zip(frames, is_key):
+            if key:
+                result = next(results)
+                data, xyxyn, cls = self.boxes_to_host(result)
+                processed_frame, action = self.process_detections(frame, data, xyxyn, cls, result.names, draw_hud=True)
+                scene["detections"] = (data, result.names, action)
+            else:
+                data, names, action = scene["detections"]
+                self.draw_boxes(frame, data, names)
+                processed_frame = self.overlay_hud(frame, action)
+            processed.append((processed_frame, action))
+        return processed
+
+    def process_result(self, frame, result, draw_hud=True):
+        data, xyxyn, cls = self.boxes_to_host(result)
+        return self.process_detections(frame, data, xyxyn, cls, result.names, draw_hud)
+
+    def boxes_to_host(self, result):
+        """
+        One GPU->CPU copy of all boxes, shared by the drawing and the risk logic.
+        Returns (data, xyxyn, cls): data rows are x1, y1, x2, y2, [track id,] conf, cls in pixels,
+        xyxyn rows are the same boxes normalized to 0-1 by Ultralytics, cls the int32 class ids.
+        The arrays are contiguous views into per-thread buffers reused across frames, valid until
+        the next call.
+        """
+        boxes = result.boxes
+        n, cols = boxes.data.shape
+        # Flat [xyxyn block | data block] so both come back contiguous from a single transfer
+        src = torch.cat((boxes.xyxyn.flatten(), boxes.data.flatten()))
+        bufs = self._box_bufs
+        if getattr(bufs, "host", None) is None or bufs.host.size < src.numel() or bufs.cls.size < n:
+            rows = max(n, self.BOX_BUF_ROWS)
+            bufs.host = np.empty(rows * (4 + cols), dtype=np.float32)
+            bufs.cls = np.empty(rows, dtype=np.int32)
+        flat = bufs.host[:src.numel()]
+        torch.from_numpy(flat).copy_(src)
+        xyxyn = flat[:n * 4].reshape(n, 4)
+        data = flat[n * 4:].reshape(n, cols)
+        cls = bufs.cls[:n]
+        np.copyto(cls, data[:, -1], casting='unsafe')
+        return data, xyxyn, cls
+
+    def process_detections(self, frame, data, xyxyn, cls, names, draw_hud=True):
+        """Draws detections (and the HUD) onto frame in place and returns it with the action."""
         max_h_norm = 0.0
         vulnerable_count = 0
         
-        # Risk Logic
-        for box in results[0].boxes:
-            cls = int(box.cls[0])
-            if cls in self.VULNERABLE_CLASSES:
-                vulnerable_count += 1
-            x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-            h_norm = (y2 - y1) / height
-            max_h_norm = max(max_h_norm, h_norm)
+        self.draw_boxes(frame, data, names)
+        
+        # Risk Logic on normalized boxes (no frame size needed)
+        if len(data):
+            max_h_norm, vulnerable_count = self.score_boxes(xyxyn, cls)
 
         risk_score = (max_h_norm * 5.0) + (vulnerable_count * 2.0)
         
@@ -50,15 +301,58 @@ class AutonomousDecisionSystem:
         
         # Draw HUD (Only if requested)
         if draw_hud:
-            cv2.rectangle(plotted_frame, (0, 0), (width, 80), (0, 0, 0), -1)
+            self.overlay_hud(frame, action)
+        
+        return frame, action
+
+    def score_boxes(self, xyxyn, cls):
+        """(tallest normalized box height, vulnerable box count) via numba, or numpy without it."""
+        if _NUMBA_AVAILABLE:
+            # boxes_to_host hands out contiguous float32/int32 views, so no copy is needed here
+            max_h_norm, vulnerable_count = compute_risk(xyxyn, cls, self.VULNERABLE_CLASSES_ARR)
+            return float(max_h_norm), int(vulnerable_count)
+        return (float((xyxyn[:, 3] - xyxyn[:, 1]).max()),
+                int(np.isin(cls, self.VULNERABLE_CLASSES_ARR).sum()))
+
+    def draw_boxes(self, frame, data, names):
+        """
+        Same boxes/labels as Results.plot() (default YOLO colors), but drawn straight onto
+        frame instead of onto a fresh copy of it.
+        """
+        annotator = Annotator(frame)
+        for *xyxy, conf, c in data[:, [0, 1, 2, 3, -2, -1]].tolist():
+            c = int(c)
+            annotator.box_label(xyxy, f"{names[c]} {conf:.2f}", color=colors(c, True))
+        return frame
+
+    def vote(self, action):
+        """Adds action to the rolling decision buffer and returns its majority action."""
+        if len(self.decision_buffer) == self.decision_buffer.maxlen:
+            evicted = self.decision_buffer[0]
+            self._vote_counts[evicted] -= 1
+            if not self._vote_counts[evicted]: del self._vote_counts[evicted]
+        self.decision_buffer.append(action)
+        self._vote_counts[action] += 1
+        return self._vote_counts.most_common(1)[0][0]
+
+    def overlay_hud(self, frame, action):
+        """Copies the pre-rendered 'ACTION: ...' bar onto the top rows of frame (in place)."""
+        height, width, _ = frame.shape
+        if width != self._hud_width:
+            self._hud_cache.clear()
+            self._hud_width = width
+        strip = self._hud_cache.get(action)
+        if strip is None:
+            strip = np.zeros((self.HUD_HEIGHT, width, 3), dtype=np.uint8)
             text_color = (0, 255, 0)
             if action == "STOP": text_color = (0, 0, 255)
             elif action == "SLOW DOWN": text_color = (0, 255, 255)
             
-            cv2.putText(plotted_frame, f"ACTION: {action}", (20, 55), 
+            cv2.putText(strip, f"ACTION: {action}", (20, 55), 
                         cv2.FONT_HERSHEY_SIMPLEX, 1.5, text_color, 3)
-        
-        return plotted_frame, action
+            self._hud_cache[action] = strip
+        frame[:self.HUD_HEIGHT] = strip[:height]
+        return frame
 
     def process_image(self, input_path, output_path):
         frame = cv2.imread(input_path)
@@ -67,42 +361,177 @@ class AutonomousDecisionSystem:
         return action
 
     def process_video(self, input_path, output_path, progress_status=None):
-        cap = cv2.VideoCapture(input_path)
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        # Metadata comes from the default backend; GStreamer pipelines often report no frame count
+        probe = cv2.VideoCapture(input_path)
+        width = int(probe.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(probe.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = int(probe.get(cv2.CAP_PROP_FPS))
         
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        total_frames = int(probe.get(cv2.CAP_PROP_FRAME_COUNT))
+        probe.release()
         if progress_status:
             progress_status["total_frames"] = total_frames
         
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+        cap = self.open_video_capture(input_path, (width, height))
+        out = self.open_video_writer(output_path, fps, (width, height))
         final_consensus_action = "GO"
         
         frame_count = 0
 
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret: break
-            
-            processed_frame, action = self.analyze_frame(frame, draw_hud=True)
-            self.decision_buffer.append(action)
-            current_action = max(set(self.decision_buffer), key=self.decision_buffer.count)
-            final_consensus_action = current_action
-            out.write(processed_frame)
-            
-            frame_count += 1
-            if progress_status:
-                progress_status["current_frame"] = frame_count
-                progress_status["progress"] = int((frame_count / total_frames) * 100)
-        
-        cap.release()
-        out.release()
+        # Decode | infer | encode pipeline: cv2 read/write run on worker threads (both release
+        # the GIL) while the model stays on this thread. Bounded FIFO queues cap memory use and
+        # keep frames in read order, so the writer emits them in sequence.
+        batches = queue.Queue(maxsize=self.PIPELINE_DEPTH)
+        processed = queue.Queue(maxsize=self.PIPELINE_DEPTH * self.BATCH_SIZE)
+        stop = threading.Event()  # Set when the pipeline ends, or early by a failing writer
+        scene = {}  # Last analyzed frame, for static-scene skipping across batches
+
+        try:
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                reader = pool.submit(self._read_batches, cap, batches, stop)
+                writer = pool.submit(self._write_frames, out, processed, stop)
+                try:
+                    while not stop.is_set():
+                        try:
+                            batch = batches.get(timeout=0.1)
+                        except queue.Empty:
+                            continue
+                        if batch is None: break
+                        
+                        for processed_frame, action in self.analyze_video_batch(batch, scene):
+                            final_consensus_action = self.vote(action)
+                            processed.put(processed_frame)
+                        
+                        frame_count += len(batch)
+                        if progress_status:
+                            progress_status["current_frame"] = frame_count
+                            progress_status["progress"] = int((frame_count / total_frames) * 100)
+                finally:
+                    stop.set()
+                    processed.put(None)
+                reader.result()
+                writer.result()
+        finally:
+            cap.release()
+            out.release()
         return final_consensus_action
 
+    def _gst_codecs(self):
+        """(decoder, encoder) GStreamer elements for the host's video engine, or None."""
+        if torch.cuda.is_available(): return "nvh264dec", "nvh264enc"
+        if sys.platform == "darwin": return "vtdec", "vtenc_h264"
+        return None
+
+    def open_video_capture(self, input_path, size):
+        """
+        Hardware H.264 decode through GStreamer (NVDEC / VideoToolbox) when available.
+        Falls back to the default cv2 backend for other hosts, containers or codecs, and whenever
+        the pipeline's frame size isn't the probed size: the default backend applies rotation
+        metadata (phone videos) and GStreamer doesn't, and the writer is sized from the probe.
+        """
+        codecs = self._gst_codecs()
+        if codecs and os.path.splitext(input_path)[1].lower() in ('.mp4', '.mov'):
+            pipeline = (f"filesrc location={input_path} ! qtdemux ! h264parse ! {codecs[0]} ! "
+                        "videoconvert ! video/x-raw,format=BGR ! appsink")
+            cap = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
+            if cap.isOpened() and (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                                   int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))) == tuple(size):
+                return cap
+            cap.release()
+        return cv2.VideoCapture(input_path)
+
+    def _ffmpeg_encoder(self):
+        """Fastest working H.264 encoder of the ffmpeg binary on PATH (NVENC, then libx264), or None."""
+        if self._ffmpeg_codec is None:
+            self._ffmpeg_codec = ""
+            if shutil.which("ffmpeg"):
+                # Being compiled in (ffmpeg -encoders) doesn't mean the GPU has NVENC (e.g. A100/H100),
+                # so pick the first encoder that survives a 1-frame test encode
+                candidates = (["h264_nvenc"] if torch.cuda.is_available() else []) + ["libx264"]
+                for encoder in candidates:
+                    if self._ffmpeg_encoder_works(encoder):
+                        self._ffmpeg_codec = encoder
+                        break
+        return self._ffmpeg_codec or None
+
+    @staticmethod
+    def _ffmpeg_encoder_works(encoder):
+        try:
+            probe = subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error",
+                                    "-f", "lavfi", "-i", "color=s=64x64", "-frames:v", "1",
+                                    "-c:v", encoder, "-f", "null", "-"],
+                                   capture_output=True, timeout=30)
+            return probe.returncode == 0
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+
+    def open_video_writer(self, output_path, fps, size):
+        """
+        Browser-friendly H.264 .mp4 writer, in order of preference:
+        ffmpeg pipe (NVENC / libx264) -> GStreamer hardware encoder -> cv2's 'mp4v' writer.
+        """
+        encoder = self._ffmpeg_encoder()
+        if encoder:
+            return FFmpegWriter(output_path, fps, size, encoder)
+
+        codecs = self._gst_codecs()
+        if codecs:
+            pipeline = (f"appsrc ! videoconvert ! {codecs[1]} ! h264parse ! mp4mux ! "
+                        f"filesink location={output_path}")
+            out = cv2.VideoWriter(pipeline, cv2.CAP_GSTREAMER, 0, fps, size, True)
+            if out.isOpened(): return out
+            out.release()
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        return cv2.VideoWriter(output_path, fourcc, fps, size)
+
+    def _read_batches(self, cap, batches, stop):
+        """Reader stage: decodes frames into lists of BATCH_SIZE, then a None end marker."""
+        batch = []
+        try:
+            while cap.isOpened() and not stop.is_set():
+                ret, frame = cap.read()
+                if ret: batch.append(frame)
+                # Full batch, or the leftover frames once the stream ends
+                if batch and (len(batch) == self.BATCH_SIZE or not ret):
+                    self._put(batches, batch, stop)
+                    batch = []
+                if not ret: break
+        finally:
+            self._put(batches, None, stop)
+
+    def _write_frames(self, out, processed, stop):
+        """Writer stage: encodes frames in the order they were queued until the None marker."""
+        error = None
+        while (frame := processed.get()) is not None:
+            if error is not None: continue  # Keep draining so the model thread never blocks on a full queue
+            try:
+                out.write(frame)
+            except Exception as e:
+                error = e
+                stop.set()  # No point running the rest of the video through the model
+        if error is not None: raise error
+
+    @staticmethod
+    def _put(q, item, stop):
+        # Blocking put that gives up once the pipeline is stopped, so the reader never hangs
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
     def generate_frames(self):
-        self.streaming_running = True
+        # A new stream takes over the camera: stop the current one and wait for its thread to let go
+        self.stop_streaming()
+        if self._cam_thread is not None:
+            self._cam_thread.join()
+        
+        with self._frame_cond:
+            self._stream_id += 1
+            stream_id = self._stream_id
+            self.streaming_running = True
+            self._latest_frame, self._frame_gen = None, 0
         self.webcam_capture = cv2.VideoCapture(0)
         self.webcam_capture.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
         self.webcam_capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
@@ -112,28 +541,75 @@ class AutonomousDecisionSystem:
             self.webcam_capture = None
             return
 
+        # The camera thread keeps only the newest frame; we always process the freshest one
+        cam_thread = threading.Thread(target=self._capture_loop, args=(self.webcam_capture, stream_id), daemon=True)
+        self._cam_thread = cam_thread
+        cam_thread.start()
+        seen_gen = 0
+        # Hash of the last frame that went through the model, and its encoded JPEG
+        last_hash, frame_bytes = None, None
+
         try:
-            while self.streaming_running:
-                success, frame = self.webcam_capture.read()
-                if not success: break
-                
-                processed_frame, action = self.analyze_frame(frame, draw_hud=False)
+            while self._is_live(stream_id):
+                with self._frame_cond:
+                    self._frame_cond.wait_for(lambda: self._frame_gen != seen_gen or not self._is_live(stream_id))
+                    if not self._is_live(stream_id): break
+                    frame, seen_gen = self._latest_frame, self._frame_gen
+                if frame is None: break
                 
-                ret, buffer = cv2.imencode('.jpg', processed_frame)
-                frame_bytes = buffer.tobytes()
+                # Near-duplicate of the last processed frame: same detections and action, resend its JPEG
+                frame_hash = self.average_hash(frame)
+                if last_hash is None or (frame_hash ^ last_hash).bit_count() >= self.PHASH_MAX_DISTANCE:
+                    processed_frame, action = self.analyze_frame(frame, draw_hud=False)
+                    frame_bytes = self.encode_jpeg(processed_frame)
+                    last_hash = frame_hash
                 yield (b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
         finally:
-            if self.webcam_capture is not None:
-                self.webcam_capture.release()
+            # Don't stop a newer stream that has already taken over
+            if self._stream_id == stream_id:
+                self.stop_streaming()
+            cam_thread.join()
+
+    def _is_live(self, stream_id):
+        return self.streaming_running and self._stream_id == stream_id
+
+    @staticmethod
+    def average_hash(frame):
+        """64-bit perceptual hash: which pixels of an 8x8 grayscale thumbnail are above its mean."""
+        small = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (8, 8), interpolation=cv2.INTER_AREA)
+        return int.from_bytes(np.packbits(small > small.mean()).tobytes(), 'big')
+
+    def _capture_loop(self, cap, stream_id):
+        """Camera thread: overwrites the one-slot frame buffer until its stream stops, then releases cap."""
+        try:
+            while self._is_live(stream_id):
+                success, frame = cap.read()
+                with self._frame_cond:
+                    self._latest_frame = frame if success else None
+                    self._frame_gen += 1
+                    self._frame_cond.notify_all()
+                if not success: break
+        finally:
+            cap.release()
+            if self.webcam_capture is cap:
                 self.webcam_capture = None
-            self.streaming_running = False
-            self.latest_action = "--"
+            with self._frame_cond:
+                # Wake the generator if it is waiting on a camera that will never deliver again
+                self._latest_frame = None
+                self._frame_gen += 1
+                self._frame_cond.notify_all()
+
+    def encode_jpeg(self, frame):
+        if self._tj is not None:
+            return self._tj.encode(frame, quality=self.JPEG_QUALITY, jpeg_subsample=TJSAMP_420)
+        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.JPEG_QUALITY])
+        return buffer.tobytes()
 
     def stop_streaming(self):
-        self.streaming_running = False
-        if self.webcam_capture is not None:
-            self.webcam_capture.release()
-            self.webcam_capture = None
+        # The camera thread releases webcam_capture itself once it sees the flag
+        with self._frame_cond:
+            self.streaming_running = False
+            self._frame_cond.notify_all()
         self.latest_action = "--"
 
     def process_webcam(self):
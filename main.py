@@ -1,6 +1,8 @@
 import os
 import shutil
 import uuid
+import asyncio
+import aiofiles
 import requests
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, UploadFile, File
@@ -18,6 +20,9 @@ is_cloud = "VERCEL" in os.environ
 base_dir = "/tmp" if is_cloud else "."
 MODEL_PATH = os.path.join(base_dir, "best.pt")
 
+# The AI detector system, created in lifespan AFTER the model is downloaded
+system: AutonomousDecisionSystem | None = None
+
 def download_model_if_needed():
     """Downloads the YOLO model if it doesn't exist in the current environment."""
     if not os.path.exists(MODEL_PATH):
@@ -31,10 +36,38 @@ def download_model_if_needed():
         except Exception as e:
             print(f"❌ Failed to download model: {e}")
 
+# INT8 calibration uses uploaded images once there are enough of them
+CALIB_MIN_IMAGES = 200
+CALIB_MAX_IMAGES = 500
+
+def build_int8_engine_if_possible():
+    """Calibrates and loads an INT8 TensorRT engine from uploaded images, if none exists yet."""
+    if not system.has_cuda or os.path.exists(system.int8_engine_path(MODEL_PATH)):
+        return
+    images = sorted(os.path.join(os.path.abspath(UPLOAD_DIR), f) for f in os.listdir(UPLOAD_DIR)
+                    if os.path.splitext(f)[1].lower() in ['.jpg', '.jpeg', '.png'])
+    if len(images) < CALIB_MIN_IMAGES:
+        return
+
+    calib_list = os.path.join(base_dir, "calib.txt")
+    calib_yaml = os.path.join(base_dir, "calib.yaml")
+    with open(calib_list, "w") as f:
+        f.write("\n".join(images[:CALIB_MAX_IMAGES]) + "\n")
+    with open(calib_yaml, "w") as f:
+        f.write(f"path: {os.path.abspath(base_dir)}\ntrain: calib.txt\nval: calib.txt\nnames:\n")
+        f.writelines(f"  {i}: {name}\n" for i, name in system.model.names.items())
+
+    if system.build_int8_engine(MODEL_PATH, calib_yaml):
+        print("✅ INT8 engine ready.")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # This logic runs on server startup
+    global system
     download_model_if_needed()
+    # Load (and warm up) the detector only once the weights are on disk
+    system = AutonomousDecisionSystem(model_path=MODEL_PATH)
+    build_int8_engine_if_possible()
     yield
 
 # Initialize FastAPI with the lifespan event
@@ -54,14 +87,13 @@ UPLOAD_DIR = os.path.join(base_dir, "uploads")
 OUTPUT_DIR = os.path.join(base_dir, "outputs")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
 
 # Serve the processed output files
 app.mount("/outputs", StaticFiles(directory=OUTPUT_DIR), name="outputs")
 
-# Initialize the AI detector system
-# Note: system needs to be initialized AFTER the model is downloaded in lifespan
-# We initialize it here; YOLO will load the file from MODEL_PATH when first used
-system = AutonomousDecisionSystem(model_path=MODEL_PATH)
+# One media job at a time: jobs share the model and processing_status
+processing_lock = asyncio.Lock()
 
 processing_status = {
     "is_processing": False, 
@@ -84,29 +116,35 @@ async def serve_app():
 
 @app.post("/process-media/")
 async def process_media_endpoint(file: UploadFile = File(...)):
+    if system is None:
+        return {"status": "starting"}
     file_id = str(uuid.uuid4())
     ext = os.path.splitext(file.filename)[1].lower()
     is_video = ext in ['.mp4', '.avi', '.mov', '.mkv']
     input_path = os.path.join(UPLOAD_DIR, f"{file_id}{ext}")
     
-    with open(input_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Stream the upload to disk without blocking the event loop (progress polling stays responsive)
+    async with aiofiles.open(input_path, "wb") as buffer:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            await buffer.write(chunk)
 
     try:
         if is_video:
             output_filename = f"processed_{file_id}.mp4"
             output_path = os.path.join(OUTPUT_DIR, output_filename)
-            processing_status.update({"is_processing": True, "progress": 0, "current_frame": 0})
-            
-            # Run YOLO detection logic from detector.py
-            final_decision = system.process_video(input_path, output_path, processing_status)
-            
-            processing_status.update({"is_processing": False, "progress": 100})
+            async with processing_lock:
+                processing_status.update({"is_processing": True, "progress": 0, "current_frame": 0})
+                
+                # Run YOLO detection logic from detector.py (worker thread keeps the event loop free)
+                final_decision = await asyncio.to_thread(system.process_video, input_path, output_path, processing_status)
+                
+                processing_status.update({"is_processing": False, "progress": 100})
             media_type = "video"
         else:
             output_filename = f"processed_{file_id}.jpg"
             output_path = os.path.join(OUTPUT_DIR, output_filename)
-            final_decision = system.process_image(input_path, output_path)
+            async with processing_lock:
+                final_decision = await asyncio.to_thread(system.process_image, input_path, output_path)
             media_type = "image"
         
         return {
@@ -125,16 +163,22 @@ def get_processing_progress():
 
 @app.get("/video_feed")
 def video_feed():
+    if system is None:
+        return {"status": "starting"}
     return StreamingResponse(system.generate_frames(), 
                              media_type='multipart/x-mixed-replace; boundary=frame')
 
 @app.post("/stop-feed-signal")
 def stop_feed_signal():
+    if system is None:
+        return {"status": "starting"}
     system.stop_streaming()
     return {"status": "stopped"}
 
 @app.get("/current-status")
 def get_current_status():
+    if system is None:
+        return {"status": "starting", "action": "--"}
     return {"action": system.latest_action}
 
 if __name__ == "__main__":